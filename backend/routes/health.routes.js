@@ -1,6 +1,6 @@
 /**
  * Health check routes (e.g. Ollama connectivity for MedGemma).
- * GET /api/health/ollama — runs Python medgemma_service with a small test input;
+ * GET /api/health/ollama — runs Python medgemma_service with a small test input (result cache bypassed);
  * returns { status: "connected", model } on success, { status: "error", message } on failure.
  */
 
@@ -14,12 +14,13 @@ const OLLAMA_HEALTH_TEST_INPUT = { CREATININE: 1.0 };
 /**
  * GET /api/health/ollama
  * Calls the Python medgemma_service with a small test input to verify Ollama (gemma:7b) is reachable.
+ * The result cache is bypassed so a cached answer cannot report "connected" while Ollama is down.
  * Success: { status: "connected", model: process.env.OLLAMA_MEDGEMMA_MODEL }
  * Failure: { status: "error", message: error.message }
  */
 router.get('/ollama', async (req, res) => {
   try {
-    await generateMedGemmaReasoningViaOllama(OLLAMA_HEALTH_TEST_INPUT);
+    await generateMedGemmaReasoningViaOllama(OLLAMA_HEALTH_TEST_INPUT, { bypassCache: true });
     return res.status(200).json({
       status: 'connected',
       model: process.env.OLLAMA_MEDGEMMA_MODEL || 'gemma:7b'
@@ -9,13 +9,25 @@ No patient Q&A. Ollama-based nephrology reasoning.
 
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
+import math
 import os
 import re
+import sqlite3
 import sys
-from typing import Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is used when absent
+    orjson = None
 
 
 # ---------------------------------------------------------------------------
@@ -26,7 +38,88 @@ OLLAMA_URL = os.environ.get("OLLAMA_MEDGEMMA_URL", "http://localhost:11434/api/g
 OLLAMA_MODEL = os.environ.get("OLLAMA_MEDGEMMA_MODEL", "gemma:7b")
 OLLAMA_TIMEOUT = int(os.environ.get("OLLAMA_MEDGEMMA_TIMEOUT", "120"))
 OLLAMA_TEMPERATURE = 0.0
-OLLAMA_STREAM = False
+OLLAMA_STREAM = True
+
+
+def _parse_keep_alive(raw: str) -> str | int:
+    """Ollama accepts a duration string ("1h", "30m") or seconds as a number (-1 = forever)."""
+    raw = raw.strip()
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+# How long Ollama keeps the model loaded after a request. Longer values avoid
+# reloading gemma:7b weights on the next cold request, at the cost of holding
+# its GPU/CPU memory while idle. Use -1 to never unload.
+OLLAMA_KEEP_ALIVE = _parse_keep_alive(os.environ.get("OLLAMA_KEEP_ALIVE", "1h"))
+
+# Any Report: abnormalities are explained by concurrent one-value prompts using
+# this many workers. Start Ollama with OLLAMA_NUM_PARALLEL >= this value so the
+# requests actually run in parallel; set to 1 to use a single combined prompt.
+OLLAMA_ANY_WORKERS = int(os.environ.get("OLLAMA_ANY_WORKERS", "4"))
+# OLLAMA_CACHE_DISABLE=1 turns off both the in-process exact-match cache and the
+# semantic cache (useful when debugging prompts against a live model).
+OLLAMA_CACHE_DISABLE = os.environ.get("OLLAMA_CACHE_DISABLE") == "1"
+OLLAMA_CACHE_MAXSIZE = 512
+
+# One keep-alive session for all Ollama calls so repeated requests reuse the
+# same connection instead of opening a new socket each time.
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=0))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=0))
+
+# Semantic result cache (sqlite, shared across the per-request Python processes
+# spawned by the Node bridges). Set OLLAMA_SEMANTIC_CACHE_PATH="" to disable.
+OLLAMA_SEMANTIC_CACHE_PATH = os.environ.get(
+    "OLLAMA_SEMANTIC_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "medgemma_semantic_cache.sqlite3"),
+)
+# 1.0 (default) only serves inputs whose canonical features are identical. Lower
+# values also match near-duplicates, which can return the explanation for a
+# different lab value; leave at 1.0 outside of experiments.
+OLLAMA_SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("OLLAMA_SEMANTIC_CACHE_THRESHOLD", "1.0"))
+OLLAMA_SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("OLLAMA_SEMANTIC_CACHE_MAX_ENTRIES", "512"))
+# Seconds a cached result stays valid (0 = never expires)
+OLLAMA_SEMANTIC_CACHE_TTL = int(os.environ.get("OLLAMA_SEMANTIC_CACHE_TTL", "86400"))
+
+
+# ---------------------------------------------------------------------------
+# JSON helpers (orjson when installed, else stdlib json)
+# ---------------------------------------------------------------------------
+
+def _json_loads(data: str | bytes) -> Any:
+    """Parse JSON text or bytes. Errors are json.JSONDecodeError (orjson's error subclasses it)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _finite_or_none(obj: Any) -> Any:
+    """Replace NaN/Infinity floats with None (nested), matching how orjson serializes them."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite_or_none(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite_or_none(v) for v in obj]
+    return obj
+
+
+def _json_dumps(obj: Any, *, sort_keys: bool = False) -> bytes:
+    """
+    Serialize to compact UTF-8 JSON bytes. Both backends emit valid JSON with
+    NaN/Infinity as null; float exponent spelling may differ (1e-7 vs 1e-07).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            pass  # e.g. non-str keys or out-of-range ints; stdlib handles these
+    return json.dumps(
+        _finite_or_none(obj), separators=(",", ":"), sort_keys=sort_keys, ensure_ascii=False, allow_nan=False
+    ).encode("utf-8")
 
 
 # ---------------------------------------------------------------------------
@@ -101,28 +194,101 @@ Here are the abnormal lab values:
 """
 
 
-def _build_prompt(structured_input: dict[str, Any]) -> str:
-    """Build the full prompt by appending structured lab JSON."""
+# ---------------------------------------------------------------------------
+# Prompt: Any Report, one abnormal value per request (used for concurrent fan-out)
+# ---------------------------------------------------------------------------
+
+MEDGEMMA_ANY_REPORT_SINGLE_PROMPT = """You are a medically cautious lab report explanation assistant working inside the ThirdOp platform under Quick Actions → Any Report Analysis.
+
+This feature helps patients understand abnormal lab results before consulting a doctor.
+
+This is NOT the nephrology engine. This is general multi-system analysis.
+
+Input: ONE structured abnormal lab value. It is already detected as outside its normal reference range.
+
+Instructions:
+- Interpret ONLY the provided abnormal lab value.
+- Do NOT invent new findings. Do NOT diagnose diseases. Do NOT rank diseases. Do NOT assign risk levels.
+- Use calm, responsible language.
+
+Create exactly ONE concern for this value. Provide explanation. Provide EXACTLY 3 questionsToAskDoctor in patient voice. Suggest ONE recommendedDepartment for this value. Provide 2–3 safe precautions.
+
+Return STRICT JSON only. No markdown. No extra keys. One valid JSON object only.
+
+{
+  "concerns": [
+    {
+      "title": "string",
+      "reason": "string",
+      "questionsToAskDoctor": ["string", "string", "string"]
+    }
+  ],
+  "recommendedDepartment": "string",
+  "precautions": ["string", "string"]
+}
+
+Here is the abnormal lab value:
+
+"""
+
+
+# Prompts travel as ready-to-send JSON string literals (bytes). The fixed
+# instruction text is escaped once here; per request only the compact lab JSON
+# is escaped and appended, with no str decode/encode round-trip.
+def _json_string_head(template: str) -> bytes:
+    """Opening quote plus escaped template text, without the closing quote."""
+    return _json_dumps(template)[:-1]
+
+
+_SYSTEM_PROMPT_HEAD = _json_string_head(MEDGEMMA_SYSTEM_PROMPT)
+_ANY_REPORT_PROMPT_HEAD = _json_string_head(MEDGEMMA_ANY_REPORT_PROMPT)
+_ANY_REPORT_SINGLE_PROMPT_HEAD = _json_string_head(MEDGEMMA_ANY_REPORT_SINGLE_PROMPT)
+
+
+def _prompt_literal(head: bytes, payload: bytes) -> bytes:
+    """
+    Close a prompt JSON string literal after appending serialized JSON payload.
+    JSON output never contains raw control characters, so escaping backslash
+    and quote is enough to embed it inside a JSON string.
+    """
+    return head + payload.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"'
+
+
+def _build_prompt(structured_input: dict[str, Any]) -> bytes:
+    """Build the full prompt (as a JSON string literal) by appending structured lab JSON."""
     if structured_input is None or not isinstance(structured_input, dict):
-        payload = "{}"
+        payload = b"{}"
     else:
-        payload = json.dumps(structured_input, indent=2)
-    return MEDGEMMA_SYSTEM_PROMPT + payload
+        # Compact separators keep whitespace tokens out of the prompt;
+        # sort_keys: key order from the caller must not defeat the exact-match cache
+        payload = _json_dumps(structured_input, sort_keys=True)
+    return _prompt_literal(_SYSTEM_PROMPT_HEAD, payload)
 
 
-def _build_any_report_prompt(abnormalities: list[Any]) -> str:
-    """Build the Any Report prompt by appending abnormal lab values JSON."""
+def _build_any_report_prompt(abnormalities: list[Any]) -> bytes:
+    """Build the Any Report prompt (as a JSON string literal) by appending abnormal lab values JSON."""
     if not isinstance(abnormalities, list):
-        payload = "[]"
+        payload = b"[]"
     else:
-        payload = json.dumps(abnormalities, indent=2)
-    return MEDGEMMA_ANY_REPORT_PROMPT + payload
+        payload = _json_dumps(abnormalities, sort_keys=True)
+    return _prompt_literal(_ANY_REPORT_PROMPT_HEAD, payload)
+
+
+def _build_any_report_single_prompt(abnormality: Any) -> bytes:
+    """Build the one-value Any Report prompt (as a JSON string literal) by appending a single abnormal lab value JSON."""
+    return _prompt_literal(_ANY_REPORT_SINGLE_PROMPT_HEAD, _json_dumps(abnormality, sort_keys=True))
 
 
 # ---------------------------------------------------------------------------
 # Markdown / code-block stripping
 # ---------------------------------------------------------------------------
 
+# Opening fence: ```json or ``` (optional language tag)
+_FENCE_OPEN = re.compile(r"^```\w*\s*\n?")
+# Closing fence
+_FENCE_CLOSE = re.compile(r"\n?```\s*$")
+
+
 def _strip_markdown_and_code_blocks(raw: str) -> str:
     """
     Remove markdown code fences (e.g. ```json ... ```) and trim.
@@ -131,78 +297,97 @@ def _strip_markdown_and_code_blocks(raw: str) -> str:
     if not raw or not isinstance(raw, str):
         return ""
     text = raw.strip()
-    # Remove opening fence: ```json or ``` (optional language tag)
-    text = re.sub(r"^```\w*\s*\n?", "", text)
-    # Remove closing fence
-    text = re.sub(r"\n?```\s*$", "", text)
+    # Fast path: already clean JSON, no fences to remove
+    if not text.startswith("```") and not text.endswith("```"):
+        return text
+    text = _FENCE_OPEN.sub("", text)
+    text = _FENCE_CLOSE.sub("", text)
     return text.strip()
 
 
+# Characters that can change brace depth or string state while scanning JSON
+_JSON_STRUCTURAL = re.compile(r'[{}"\\]')
+
+
+def _extract_first_json_object(text: str) -> str:
+    """
+    Cut text down to its first balanced top-level {...} object, dropping any
+    prose before it or trailing tokens after it. Braces inside JSON strings
+    (including escaped quotes) are ignored. Jumps between structural
+    characters instead of visiting every character. If there is no opening
+    brace or the object never closes, the text is returned so json parsing
+    reports the problem.
+    """
+    start = text.find("{")
+    if start < 0:
+        return text
+    search = _JSON_STRUCTURAL.search
+    depth = 0
+    in_string = False
+    pos = start
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return text[start:]
+        ch = m.group()
+        i = m.start()
+        pos = i + 1
+        if in_string:
+            if ch == "\\":
+                pos = i + 2  # skip the escaped character
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:pos]
+
+
 # ---------------------------------------------------------------------------
 # Response shape validation and normalization (concerns only; no qa)
 # ---------------------------------------------------------------------------
 
 def _normalize_concern(c: Any) -> dict[str, Any] | None:
-    """Ensure one concern has title (string), reason (string), doctorQuestions (array of strings). Accepts questionsToAskDoctor or doctorQuestions from model; outputs doctorQuestions for API (up to 3). Missing default to []."""
+    """Ensure one concern has title (string), reason (string), doctorQuestions (array of strings). Accepts questionsToAskDoctor or doctorQuestions from model; outputs doctorQuestions for API (up to 3). Missing default to []. Returns None when the concern has neither title nor reason."""
     if not c or not isinstance(c, dict):
         return None
     title = c.get("title")
     reason = c.get("reason")
-    if title is None and reason is None:
+    title = str(title).strip() if title is not None else ""
+    reason = str(reason).strip() if reason is not None else ""
+    if not title and not reason:
         return None
     raw_questions = c.get("questionsToAskDoctor") or c.get("doctorQuestions")
     if not isinstance(raw_questions, list):
         doctor_questions: list[str] = []
     else:
         doctor_questions = [
-            str(q).strip()
-            for q in raw_questions[:3]
-            if q is not None and str(q).strip()
+            q for q in (str(q).strip() for q in raw_questions[:3] if q is not None) if q
         ]
     return {
-        "title": str(title).strip() if title is not None else "",
-        "reason": str(reason).strip() if reason is not None else "",
+        "title": title,
+        "reason": reason,
         "doctorQuestions": doctor_questions,
     }
 
 
+def _normalize_concerns(concerns_raw: Any) -> list[dict[str, Any]]:
+    """Validate and normalize model concerns in one pass; drops entries without title or reason."""
+    if not isinstance(concerns_raw, list):
+        return []
+    return [n for n in map(_normalize_concern, concerns_raw) if n is not None]
+
+
 def _enforce_structure(parsed: dict[str, Any]) -> dict[str, Any]:
     """
     Enforce strict return structure: concerns only.
     Each concern must contain title (string), reason (string), doctorQuestions (array of strings from questionsToAskDoctor). If missing, default to [].
     """
-    concerns_raw = parsed.get("concerns")
-    concerns: list[dict[str, Any]] = []
-    if isinstance(concerns_raw, list):
-        for c in concerns_raw:
-            n = _normalize_concern(c)
-            if n and (n["title"] or n["reason"]):
-                concerns.append(n)
-    return {"concerns": concerns}
-
-
-def _normalize_any_report_concern(c: Any) -> dict[str, Any] | None:
-    """One concern for Any Report: title, reason, doctorQuestions (from questionsToAskDoctor, up to 3)."""
-    if not c or not isinstance(c, dict):
-        return None
-    title = c.get("title")
-    reason = c.get("reason")
-    if title is None and reason is None:
-        return None
-    raw_questions = c.get("questionsToAskDoctor") or c.get("doctorQuestions")
-    if not isinstance(raw_questions, list):
-        doctor_questions: list[str] = []
-    else:
-        doctor_questions = [
-            str(q).strip()
-            for q in raw_questions[:3]
-            if q is not None and str(q).strip()
-        ]
-    return {
-        "title": str(title).strip() if title is not None else "",
-        "reason": str(reason).strip() if reason is not None else "",
-        "doctorQuestions": doctor_questions,
-    }
+    return {"concerns": _normalize_concerns(parsed.get("concerns"))}
 
 
 def _enforce_any_report_structure(parsed: dict[str, Any]) -> dict[str, Any]:
@@ -210,13 +395,7 @@ def _enforce_any_report_structure(parsed: dict[str, Any]) -> dict[str, Any]:
     Enforce Any Report output: concerns[], recommendedDepartment (string), precautions (array of strings).
     If missing, recommendedDepartment defaults to ""; precautions defaults to [].
     """
-    concerns_raw = parsed.get("concerns")
-    concerns: list[dict[str, Any]] = []
-    if isinstance(concerns_raw, list):
-        for c in concerns_raw:
-            n = _normalize_any_report_concern(c)
-            if n and (n["title"] or n["reason"]):
-                concerns.append(n)
+    concerns = _normalize_concerns(parsed.get("concerns"))
     recommended = parsed.get("recommendedDepartment")
     if not isinstance(recommended, str):
         recommended = ""
@@ -226,7 +405,7 @@ def _enforce_any_report_structure(parsed: dict[str, Any]) -> dict[str, Any]:
     if not isinstance(prec_raw, list):
         precautions: list[str] = []
     else:
-        precautions = [str(p).strip() for p in prec_raw if p is not None and str(p).strip()][:3]
+        precautions = [p for p in (str(p).strip() for p in prec_raw if p is not None) if p][:3]
     return {
         "concerns": concerns,
         "recommendedDepartment": recommended,
@@ -238,55 +417,299 @@ def _enforce_any_report_structure(parsed: dict[str, Any]) -> dict[str, Any]:
 # Ollama API call and error handling
 # ---------------------------------------------------------------------------
 
-def _call_ollama(prompt: str) -> str:
+def _read_ollama_response(resp: requests.Response) -> str:
     """
-    POST to Ollama /api/generate; returns the full response text.
-    Raises on network/API errors.
+    Collect the generated text from an Ollama /api/generate response.
+    When streaming, each line is a JSON chunk whose "response" fields are
+    concatenated until a chunk reports done=true; the stream is still read to
+    EOF so the connection can go back to the session's pool. Otherwise the
+    full text is in the single body's "response" field.
     """
-    payload = {
-        "model": OLLAMA_MODEL,
-        "prompt": prompt,
+    if not OLLAMA_STREAM:
+        text = _json_loads(resp.content).get("response")
+        if text is None:
+            raise ValueError("Ollama response missing 'response' field")
+        return text if isinstance(text, str) else str(text)
+
+    text_parts: list[str] = []
+    saw_response = False
+    done = False
+    for line in resp.iter_lines():
+        if not line or done:
+            continue
+        chunk = _json_loads(line)
+        if chunk.get("error"):
+            raise ValueError(f"Ollama stream error: {chunk['error']}")
+        part = chunk.get("response")
+        if part is not None:
+            saw_response = True
+            text_parts.append(part if isinstance(part, str) else str(part))
+        done = bool(chunk.get("done"))
+    if not saw_response:
+        raise ValueError("Ollama response missing 'response' field")
+    return "".join(text_parts)
+
+
+@functools.lru_cache(maxsize=8)
+def _request_body_head(model: str, temperature: float) -> bytes:
+    """Serialized /api/generate fields other than the prompt, left open for the prompt value."""
+    fields = {
+        "model": model,
         "stream": OLLAMA_STREAM,
-        "options": {"temperature": OLLAMA_TEMPERATURE},
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"temperature": temperature},
     }
-    resp = requests.post(
-        OLLAMA_URL,
-        json=payload,
-        timeout=OLLAMA_TIMEOUT,
+    return _json_dumps(fields)[:-1] + b',"prompt":'
+
+
+def _post_generate(url: str, model: str, prompt: bytes, timeout: int, temperature: float) -> str:
+    """
+    POST to Ollama /api/generate; returns the full response text.
+    prompt is a JSON string literal as produced by the _build_*prompt helpers.
+    Raises on network/API errors.
+    """
+    with _SESSION.post(
+        url,
+        data=_request_body_head(model, temperature) + prompt + b"}",
+        timeout=timeout,
         headers={"Content-Type": "application/json"},
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    # When stream=false, full text is in "response"
-    text = data.get("response")
-    if text is None:
-        raise ValueError("Ollama response missing 'response' field")
-    return text if isinstance(text, str) else str(text)
+        stream=OLLAMA_STREAM,
+    ) as resp:
+        resp.raise_for_status()
+        return _read_ollama_response(resp)
+
 
+# Temperature 0 is deterministic, so identical (url, model, prompt) always give
+# the same text. Failed calls raise and are therefore never cached.
+_cached_post_generate = functools.lru_cache(maxsize=OLLAMA_CACHE_MAXSIZE)(_post_generate)
 
-def _call_ollama_generic(prompt: str) -> str:
+
+def _generate(url: str, model: str, prompt: bytes, timeout: int, temperature: float) -> str:
+    """Exact-match cached _post_generate for temperature-0 calls unless OLLAMA_CACHE_DISABLE=1."""
+    if OLLAMA_CACHE_DISABLE or temperature != 0.0:
+        return _post_generate(url, model, prompt, timeout, temperature)
+    return _cached_post_generate(url, model, prompt, timeout, temperature)
+
+
+def _call_ollama(prompt: bytes) -> str:
+    """
+    POST to Ollama /api/generate; returns the full response text.
+    Raises on network/API errors.
+    """
+    return _generate(OLLAMA_URL, OLLAMA_MODEL, prompt, OLLAMA_TIMEOUT, OLLAMA_TEMPERATURE)
+
+
+def _call_ollama_generic(prompt: bytes) -> str:
     """Same as _call_ollama but uses OLLAMA_GENERIC_* env (Any Report Analysis). Temperature = 0.0."""
     url = os.environ.get("OLLAMA_GENERIC_URL", OLLAMA_URL)
     model = os.environ.get("OLLAMA_GENERIC_MODEL", OLLAMA_MODEL)
     timeout = int(os.environ.get("OLLAMA_GENERIC_TIMEOUT", str(OLLAMA_TIMEOUT)))
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": OLLAMA_STREAM,
-        "options": {"temperature": 0.0},
+    return _generate(url, model, prompt, timeout, 0.0)
+
+
+# ---------------------------------------------------------------------------
+# Structured error results
+# ---------------------------------------------------------------------------
+
+def _clinical_error(message: str) -> dict[str, Any]:
+    """Error object for generate_clinical_reasoning (no exception raised)."""
+    return {"error": True, "message": message, "concerns": []}
+
+
+def _any_report_error(message: str) -> dict[str, Any]:
+    """Error object for generate_any_report_reasoning (no exception raised)."""
+    return {
+        "error": True,
+        "message": message,
+        "concerns": [],
+        "recommendedDepartment": "",
+        "precautions": [],
     }
-    resp = requests.post(
-        url,
-        json=payload,
-        timeout=timeout,
-        headers={"Content-Type": "application/json"},
+
+
+# ---------------------------------------------------------------------------
+# Semantic cache: reuse results for identical (canonicalized) lab inputs
+# ---------------------------------------------------------------------------
+
+def _canonical_scalar(v: Any) -> str:
+    """
+    Canonical text for one lab value: numbers as the exact repr of their float
+    (so 0.004 and 0.001 stay distinct; 1 and 1.0 are the same), strings trimmed
+    and lowercased, numeric strings parsed as numbers.
+    """
+    if isinstance(v, bool) or v is None:
+        return json.dumps(v)
+    if isinstance(v, (int, float)):
+        try:
+            return repr(float(v))
+        except OverflowError:
+            return repr(v)  # int beyond float range
+    if isinstance(v, str):
+        text = v.strip().lower()
+        try:
+            return repr(float(text))
+        except (ValueError, OverflowError):
+            return text
+    return json.dumps(v, sort_keys=True, default=str)
+
+
+def _input_features(payload: Any) -> tuple[str, ...]:
+    """
+    (key, value) features for a lab payload, exact up to key case/whitespace.
+    Dicts yield one feature per key, sorted so key order does not matter; lists
+    (Any Report abnormalities) yield one feature per item in input order, so a
+    cache hit returns concerns in the caller's order and repeated items count.
+    """
+    if isinstance(payload, dict):
+        return tuple(sorted(
+            f"{str(k).strip().lower()}={_canonical_scalar(v)}" for k, v in payload.items()
+        ))
+    if isinstance(payload, list):
+        return tuple(
+            "|".join(_input_features(item)) if isinstance(item, dict) else _canonical_scalar(item)
+            for item in payload
+        )
+    return (_canonical_scalar(payload),)
+
+
+def _feature_key(features: tuple[str, ...]) -> str:
+    """Stable hash of a feature tuple; equal keys mean an exact canonical match."""
+    return hashlib.sha256(json.dumps(list(features)).encode("utf-8")).hexdigest()
+
+
+def _feature_similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    """Cosine similarity of two binary feature vectors."""
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+class SemanticCache:
+    """
+    Cache of successful model results, keyed by the canonical feature bag of
+    the lab input. By default (threshold 1.0) only an identical feature bag is
+    a hit, found through its hash key; a lower threshold additionally accepts
+    the most similar stored input by cosine similarity. Entries expire after
+    `ttl` seconds and live in sqlite so hits survive across processes; any
+    storage error is a miss.
+    """
+
+    def __init__(self, path: str, threshold: float = 1.0, max_entries: int = 512, ttl: int = 86400) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, key TEXT NOT NULL, "
+            "features TEXT NOT NULL, result TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_key ON results (namespace, key)")
+        return conn
+
+    def _cutoff(self) -> float:
+        """Oldest creation time still valid."""
+        return time.time() - self.ttl if self.ttl > 0 else 0.0
+
+    def lookup(self, namespace: str, payload: Any) -> dict[str, Any] | None:
+        """Return the cached result for payload (exact match, or closest above threshold), else None."""
+        query = _input_features(payload)
+        cutoff = self._cutoff()
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT result FROM results WHERE namespace = ? AND key = ? AND created >= ? "
+                    "ORDER BY id DESC LIMIT 1",
+                    (namespace, _feature_key(query), cutoff),
+                ).fetchone()
+                rows = []
+                if row is None and self.threshold < 1.0:
+                    rows = conn.execute(
+                        "SELECT features, result FROM results WHERE namespace = ? AND created >= ? "
+                        "ORDER BY id DESC LIMIT ?",
+                        (namespace, cutoff, self.max_entries),
+                    ).fetchall()
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError):
+            return None
+        if row is not None:
+            return _json_loads(row[0])
+        best_score, best_result = 0.0, None
+        for features_json, result_json in rows:
+            score = _feature_similarity(frozenset(query), frozenset(_json_loads(features_json)))
+            if score > best_score:
+                best_score, best_result = score, result_json
+        if best_result is None or best_score < self.threshold:
+            return None
+        return _json_loads(best_result)
+
+    def store(self, namespace: str, payload: Any, result: dict[str, Any]) -> None:
+        """Insert result for payload, drop expired entries and trim the namespace to max_entries."""
+        features = _input_features(payload)
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT INTO results (namespace, key, features, result, created) VALUES (?, ?, ?, ?, ?)",
+                        (namespace, _feature_key(features), json.dumps(list(features)),
+                         json.dumps(result), time.time()),
+                    )
+                    conn.execute("DELETE FROM results WHERE created < ?", (self._cutoff(),))
+                    conn.execute(
+                        "DELETE FROM results WHERE namespace = ? AND id NOT IN "
+                        "(SELECT id FROM results WHERE namespace = ? ORDER BY id DESC LIMIT ?)",
+                        (namespace, namespace, self.max_entries),
+                    )
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError):
+            pass
+
+
+_SEMANTIC_CACHE = (
+    SemanticCache(
+        OLLAMA_SEMANTIC_CACHE_PATH,
+        threshold=OLLAMA_SEMANTIC_CACHE_THRESHOLD,
+        max_entries=OLLAMA_SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl=OLLAMA_SEMANTIC_CACHE_TTL,
     )
-    resp.raise_for_status()
-    data = resp.json()
-    text = data.get("response")
-    if text is None:
-        raise ValueError("Ollama response missing 'response' field")
-    return text if isinstance(text, str) else str(text)
+    if OLLAMA_SEMANTIC_CACHE_PATH and not OLLAMA_CACHE_DISABLE
+    else None
+)
+
+
+# Bump when _input_features changes so keys written under an older scheme are never matched
+_CACHE_KEY_VERSION = 2
+
+
+def _cache_namespace(kind: str, model: str, prompt_template: str) -> str:
+    """Partition cache entries by feature, model and prompt text so either change invalidates old results."""
+    digest = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:16]
+    return f"v{_CACHE_KEY_VERSION}:{kind}:{model}:{digest}"
+
+
+def _with_semantic_cache(
+    namespace: str,
+    payload: Any,
+    compute: Callable[[Any], dict[str, Any]],
+) -> dict[str, Any]:
+    """Serve payload from the semantic cache, or compute it and cache non-error results."""
+    if _SEMANTIC_CACHE is None:
+        return compute(payload)
+    cached = _SEMANTIC_CACHE.lookup(namespace, payload)
+    if cached is not None:
+        return cached
+    result = compute(payload)
+    if not result.get("error"):
+        _SEMANTIC_CACHE.store(namespace, payload, result)
+    return result
 
 
 # ---------------------------------------------------------------------------
@@ -301,6 +724,9 @@ def generate_clinical_reasoning(structured_input: dict[str, Any]) -> dict[str, A
     - Strips markdown/code blocks from model output.
     - Parses JSON and enforces shape: concerns[] with title, reason, doctorQuestions.
     - On JSON parse failure, returns a structured error object (no exception).
+    - Successful results are cached; an identical input (same keys and values
+      after key normalization) is answered from the semantic cache without calling Ollama.
+      Set OLLAMA_CACHE_DISABLE=1 to always call the model (health checks, tests).
 
     Args:
         structured_input: Lab values as a dict (e.g. reportData or canonical lab JSON).
@@ -311,45 +737,34 @@ def generate_clinical_reasoning(structured_input: dict[str, Any]) -> dict[str, A
         On parse/API error:
             { "error": true, "message": "...", "concerns": [] }
     """
+    return _with_semantic_cache(
+        _cache_namespace("clinical", OLLAMA_MODEL, MEDGEMMA_SYSTEM_PROMPT),
+        structured_input,
+        _run_clinical_reasoning,
+    )
+
+
+def _run_clinical_reasoning(structured_input: dict[str, Any]) -> dict[str, Any]:
+    """Uncached body of generate_clinical_reasoning: one Ollama call plus parsing."""
     try:
         prompt = _build_prompt(structured_input)
         raw_text = _call_ollama(prompt)
     except requests.exceptions.RequestException as e:
-        return {
-            "error": True,
-            "message": f"Ollama request failed: {e!s}",
-            "concerns": [],
-        }
+        return _clinical_error(f"Ollama request failed: {e!s}")
     except ValueError as e:
-        return {
-            "error": True,
-            "message": f"Ollama response invalid: {e!s}",
-            "concerns": [],
-        }
+        return _clinical_error(f"Ollama response invalid: {e!s}")
 
-    cleaned = _strip_markdown_and_code_blocks(raw_text)
+    cleaned = _extract_first_json_object(_strip_markdown_and_code_blocks(raw_text))
     if not cleaned:
-        return {
-            "error": True,
-            "message": "Model returned empty or non-JSON content",
-            "concerns": [],
-        }
+        return _clinical_error("Model returned empty or non-JSON content")
 
     try:
-        parsed = json.loads(cleaned)
+        parsed = _json_loads(cleaned)
     except json.JSONDecodeError as e:
-        return {
-            "error": True,
-            "message": f"JSON parse failed: {e!s}",
-            "concerns": [],
-        }
+        return _clinical_error(f"JSON parse failed: {e!s}")
 
     if not isinstance(parsed, dict):
-        return {
-            "error": True,
-            "message": "Model did not return a JSON object",
-            "concerns": [],
-        }
+        return _clinical_error("Model did not return a JSON object")
 
     return _enforce_structure(parsed)
 
@@ -358,6 +773,10 @@ def generate_any_report_reasoning(abnormalities: list[Any]) -> dict[str, Any]:
     """
     Run Any Report (general multi-system) lab explanation via Ollama.
     Uses MEDGEMMA_ANY_REPORT_PROMPT. Temperature = 0.0 for deterministic output.
+    With several abnormalities and OLLAMA_ANY_WORKERS > 1, each value is sent as
+    its own MEDGEMMA_ANY_REPORT_SINGLE_PROMPT request concurrently and the results
+    are merged (see _merge_any_report_results).
+    Successful results are served from the semantic cache for identical inputs.
 
     Args:
         abnormalities: List of { parameter, value, status } (structured abnormal lab values only).
@@ -372,31 +791,82 @@ def generate_any_report_reasoning(abnormalities: list[Any]) -> dict[str, Any]:
         On parse/API error:
             { "error": true, "message": "...", "concerns": [], "recommendedDepartment": "", "precautions": [] }
     """
-    err_out = {
-        "error": True,
-        "concerns": [],
-        "recommendedDepartment": "",
-        "precautions": [],
+    return _with_semantic_cache(
+        _cache_namespace(
+            # combined-prompt and per-value fan-out answers are kept apart
+            "any_report:fanout" if OLLAMA_ANY_WORKERS > 1 else "any_report:combined",
+            os.environ.get("OLLAMA_GENERIC_MODEL", OLLAMA_MODEL),
+            MEDGEMMA_ANY_REPORT_PROMPT + MEDGEMMA_ANY_REPORT_SINGLE_PROMPT,
+        ),
+        abnormalities,
+        _run_any_report_reasoning,
+    )
+
+
+def _run_any_report_reasoning(abnormalities: list[Any]) -> dict[str, Any]:
+    """Uncached body of generate_any_report_reasoning: combined prompt, or concurrent per-value prompts."""
+    if not isinstance(abnormalities, list) or len(abnormalities) < 2 or OLLAMA_ANY_WORKERS < 2:
+        return _any_report_from_prompt(_build_any_report_prompt(abnormalities))
+    with ThreadPoolExecutor(max_workers=min(OLLAMA_ANY_WORKERS, len(abnormalities))) as ex:
+        results = list(ex.map(
+            lambda a: _any_report_from_prompt(_build_any_report_single_prompt(a)),
+            abnormalities,
+        ))
+    return _merge_any_report_results(results)
+
+
+def _merge_any_report_results(results: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Merge per-value Any Report results in input order: one concern per value,
+    recommendedDepartment is the shared department or "Internal Medicine" when
+    values point to different ones, precautions are de-duplicated (up to 3).
+    If any value failed, the whole result is an error (never a silently
+    truncated report, which the semantic cache would otherwise persist).
+    """
+    failed = [r for r in results if r.get("error")]
+    if failed:
+        return _any_report_error(
+            f"{len(failed)} of {len(results)} abnormal values failed: {failed[0].get('message', '')}"
+        )
+    concerns = [c for r in results for c in r["concerns"][:1]]
+    departments = {r["recommendedDepartment"].lower(): r["recommendedDepartment"] for r in results if r["recommendedDepartment"]}
+    if len(departments) > 1:
+        recommended = "Internal Medicine"
+    else:
+        recommended = next(iter(departments.values()), "")
+    precautions: list[str] = []
+    seen: set[str] = set()
+    for p in (p for r in results for p in r["precautions"]):
+        if p.lower() not in seen:
+            seen.add(p.lower())
+            precautions.append(p)
+    return {
+        "concerns": concerns,
+        "recommendedDepartment": recommended,
+        "precautions": precautions[:3],
     }
+
+
+def _any_report_from_prompt(prompt: bytes) -> dict[str, Any]:
+    """One Any Report Ollama call plus parsing; structured error object on failure."""
     try:
-        prompt = _build_any_report_prompt(abnormalities)
         raw_text = _call_ollama_generic(prompt)
     except requests.exceptions.RequestException as e:
-        return { **err_out, "message": f"Ollama request failed: {e!s}" }
+        return _any_report_error(f"Ollama request failed: {e!s}")
     except ValueError as e:
-        return { **err_out, "message": f"Ollama response invalid: {e!s}" }
+        return _any_report_error(f"Ollama response invalid: {e!s}")
 
-    cleaned = _strip_markdown_and_code_blocks(raw_text)
+    cleaned = _extract_first_json_object(_strip_markdown_and_code_blocks(raw_text))
     if not cleaned:
-        return { **err_out, "message": "Model returned empty or non-JSON content" }
+        return _any_report_error("Model returned empty or non-JSON content")
 
     try:
-        parsed = json.loads(cleaned)
+        parsed = _json_loads(cleaned)
     except json.JSONDecodeError as e:
-        return { **err_out, "message": f"JSON parse failed: {e!s}" }
+        return _any_report_error(f"JSON parse failed: {e!s}")
 
     if not isinstance(parsed, dict):
-        return { **err_out, "message": "Model did not return a JSON object" }
+        return _any_report_error("Model did not return a JSON object")
 
     return _enforce_any_report_structure(parsed)
 
@@ -414,7 +884,7 @@ def _main() -> None:
             with open(path, "r", encoding="utf-8") as f:
                 structured_input = json.load(f)
         except (OSError, json.JSONDecodeError) as e:
-            out = {"error": True, "message": str(e), "concerns": []}
+            out = _clinical_error(str(e))
             print(json.dumps(out))
             sys.exit(1)
     else:
@@ -422,7 +892,7 @@ def _main() -> None:
             raw = sys.stdin.read()
             structured_input = json.loads(raw) if raw.strip() else {}
         except json.JSONDecodeError as e:
-            out = {"error": True, "message": str(e), "concerns": []}
+            out = _clinical_error(str(e))
             print(json.dumps(out))
             sys.exit(1)
 
@@ -19,10 +19,11 @@ const PYTHON_PATH = path.join(__dirname, '..', '.venv', 'bin', 'python3');
 /**
  * Call Python MedGemma service with structured lab input.
  * @param {Object} structuredLabInput - Lab values as plain object (e.g. reportData)
+ * @param {{ bypassCache?: boolean }} [options] - bypassCache: always call Ollama (sets OLLAMA_CACHE_DISABLE=1 for the child)
  * @returns {Promise<{ concerns: Array<{ title: string, reason: string, doctorQuestions: string[] }> }>}
  * @throws {Error} If Python unavailable, script fails, or response has error: true (structured error, no cloud fallback)
  */
-function generateMedGemmaReasoningViaOllama(structuredLabInput) {
+function generateMedGemmaReasoningViaOllama(structuredLabInput, options = {}) {
   return new Promise((resolve, reject) => {
     if (!fs.existsSync(PYTHON_PATH)) {
       console.error('[Ollama MedGemma] Python venv not found. Run setup first.');
@@ -39,6 +40,7 @@ function generateMedGemmaReasoningViaOllama(structuredLabInput) {
 
     const child = spawn(PYTHON_PATH, [SCRIPT_PATH], {
       cwd: path.dirname(__dirname),
+      env: options.bypassCache ? { ...process.env, OLLAMA_CACHE_DISABLE: '1' } : process.env,
       stdio: ['pipe', 'pipe', 'pipe']
     });
 
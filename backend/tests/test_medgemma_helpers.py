@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Offline unit tests for the pure helpers in the MedGemma/Ollama service.
+
+No Ollama needed; only the service's own deps (requests, optional orjson).
+
+Run from repo root:
+  python -m unittest backend/tests/test_medgemma_helpers.py
+  # or
+  cd backend && python -m unittest tests.test_medgemma_helpers
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Allow importing the service from backend/services
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from services import medgemma_service as ms
+
+
+class ExtractFirstJsonObjectTest(unittest.TestCase):
+    def test_plain_object_unchanged(self) -> None:
+        text = '{"concerns": []}'
+        self.assertEqual(ms._extract_first_json_object(text), text)
+
+    def test_leading_and_trailing_prose_dropped(self) -> None:
+        text = 'Here is the JSON:\n{"concerns": [{"title": "Low eGFR"}]}\nHope this helps!'
+        self.assertEqual(ms._extract_first_json_object(text), '{"concerns": [{"title": "Low eGFR"}]}')
+
+    def test_braces_inside_strings_ignored(self) -> None:
+        obj = '{"reason": "values {high} and } stray {", "n": {"x": 1}}'
+        self.assertEqual(ms._extract_first_json_object(obj + " trailing }"), obj)
+
+    def test_escaped_quotes_inside_strings(self) -> None:
+        obj = r'{"reason": "the \"eGFR}\" value", "q": ["a\"{"]}'
+        result = ms._extract_first_json_object(obj + ' {"second": 1}')
+        self.assertEqual(result, obj)
+        self.assertEqual(json.loads(result)["reason"], 'the "eGFR}" value')
+
+    def test_escaped_backslash_before_closing_quote(self) -> None:
+        obj = r'{"path": "C:\\", "next": "}"}'
+        self.assertEqual(ms._extract_first_json_object(obj + " tail"), obj)
+        self.assertEqual(json.loads(obj)["path"], "C:\\")
+
+    def test_second_object_dropped(self) -> None:
+        self.assertEqual(ms._extract_first_json_object('{"a": 1}{"b": 2}'), '{"a": 1}')
+
+    def test_unterminated_object_returned_for_parser(self) -> None:
+        text = 'prefix {"concerns": [{"title": "x"'
+        result = ms._extract_first_json_object(text)
+        self.assertEqual(result, '{"concerns": [{"title": "x"')
+        with self.assertRaises(json.JSONDecodeError):
+            json.loads(result)
+
+    def test_unterminated_string_returned_for_parser(self) -> None:
+        text = '{"reason": "never closed }'
+        self.assertEqual(ms._extract_first_json_object(text), text)
+
+    def test_no_object(self) -> None:
+        self.assertEqual(ms._extract_first_json_object("no json here"), "no json here")
+
+
+class PromptLiteralTest(unittest.TestCase):
+    def test_round_trips_as_json_string(self) -> None:
+        payload = ms._json_dumps({"note": 'say "hi" \\ bye', "value": 1.5})
+        literal = ms._prompt_literal(ms._json_string_head("Head:\n"), payload)
+        self.assertEqual(json.loads(literal), "Head:\n" + payload.decode("utf-8"))
+
+    def test_build_prompt_appends_sorted_compact_payload(self) -> None:
+        prompt = json.loads(ms._build_prompt({"b": 2, "a": 'x"y'}))
+        self.assertEqual(prompt, ms.MEDGEMMA_SYSTEM_PROMPT + '{"a":"x\\"y","b":2}')
+
+    def test_non_dict_input_becomes_empty_object(self) -> None:
+        self.assertEqual(json.loads(ms._build_prompt(None)), ms.MEDGEMMA_SYSTEM_PROMPT + "{}")
+
+    def test_any_report_prompts(self) -> None:
+        item = {"parameter": "Glucose", "value": 180, "status": "high"}
+        self.assertEqual(
+            json.loads(ms._build_any_report_prompt([item])),
+            ms.MEDGEMMA_ANY_REPORT_PROMPT + '[{"parameter":"Glucose","status":"high","value":180}]',
+        )
+        self.assertEqual(
+            json.loads(ms._build_any_report_single_prompt(item)),
+            ms.MEDGEMMA_ANY_REPORT_SINGLE_PROMPT + '{"parameter":"Glucose","status":"high","value":180}',
+        )
+
+
+class _FakeStreamResponse:
+    """Stands in for a streamed requests.Response; records how many lines were read."""
+
+    def __init__(self, chunks: list) -> None:
+        self._lines = [c if isinstance(c, bytes) else json.dumps(c).encode() for c in chunks]
+        self.consumed = 0
+
+    def iter_lines(self):
+        for line in self._lines:
+            self.consumed += 1
+            yield line
+
+
+class ReadOllamaResponseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.object(ms, "OLLAMA_STREAM", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chunks_joined_and_stream_drained_after_done(self) -> None:
+        resp = _FakeStreamResponse([
+            {"response": '{"a"', "done": False},
+            b"",
+            {"response": ": 1}", "done": True},
+            {"response": " ignored"},
+            b"trailing",
+        ])
+        self.assertEqual(ms._read_ollama_response(resp), '{"a": 1}')
+        self.assertEqual(resp.consumed, 5)
+
+    def test_error_chunk_raises(self) -> None:
+        resp = _FakeStreamResponse([{"response": "x"}, {"error": "model not found"}])
+        with self.assertRaisesRegex(ValueError, "model not found"):
+            ms._read_ollama_response(resp)
+
+    def test_missing_response_field_raises(self) -> None:
+        resp = _FakeStreamResponse([{"done": False}, {"done": True}])
+        with self.assertRaisesRegex(ValueError, "missing 'response'"):
+            ms._read_ollama_response(resp)
+
+    def test_malformed_chunk_raises(self) -> None:
+        resp = _FakeStreamResponse([{"response": "x"}, b'{"response": "y"'])
+        with self.assertRaises(ValueError):
+            ms._read_ollama_response(resp)
+
+
+class SemanticCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "cache.sqlite3")
+        self.cache = ms.SemanticCache(self.path)
+        self.payload = {f"LAB_{i}": float(i) for i in range(20)}
+        self.result = {"concerns": [{"title": "t", "reason": "r", "doctorQuestions": []}]}
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_exact_match_ignores_key_order_and_case(self) -> None:
+        self.cache.store("ns", self.payload, self.result)
+        reordered = {f" {k.lower()} ": v for k, v in reversed(list(self.payload.items()))}
+        self.assertEqual(self.cache.lookup("ns", reordered), self.result)
+
+    def test_int_and_float_spellings_match(self) -> None:
+        self.cache.store("ns", {"UREA": 48}, self.result)
+        self.assertEqual(self.cache.lookup("ns", {"UREA": 48.0}), self.result)
+        self.assertEqual(self.cache.lookup("ns", {"UREA": "48"}), self.result)
+
+    def test_one_changed_value_is_a_miss(self) -> None:
+        self.cache.store("ns", self.payload, self.result)
+        changed = dict(self.payload, LAB_0=9.9)
+        self.assertIsNone(self.cache.lookup("ns", changed))
+
+    def test_values_are_not_rounded(self) -> None:
+        self.cache.store("ns", {"TROPONIN I (ng/mL)": 0.004}, self.result)
+        self.assertIsNone(self.cache.lookup("ns", {"TROPONIN I (ng/mL)": 0.001}))
+        self.cache.store("ns", {"CREATININE": 1.234}, self.result)
+        self.assertIsNone(self.cache.lookup("ns", {"CREATININE": 1.2349}))
+
+    def test_list_items_keep_order_and_multiplicity(self) -> None:
+        a = {"parameter": "Glucose", "value": 180, "status": "high"}
+        b = {"parameter": "Hemoglobin", "value": 9.1, "status": "low"}
+        self.cache.store("ns", [a, b], self.result)
+        self.assertEqual(self.cache.lookup("ns", [dict(reversed(list(a.items()))), b]), self.result)
+        self.assertIsNone(self.cache.lookup("ns", [b, a]))
+        self.cache.store("ns", [a], self.result)
+        self.assertIsNone(self.cache.lookup("ns", [a, a]))
+
+    def test_namespaces_are_isolated(self) -> None:
+        self.cache.store("ns", self.payload, self.result)
+        self.assertIsNone(self.cache.lookup("other", self.payload))
+
+    def test_entries_expire_after_ttl(self) -> None:
+        cache = ms.SemanticCache(self.path, ttl=60)
+        with mock.patch.object(ms.time, "time", return_value=1000.0):
+            cache.store("ns", self.payload, self.result)
+        with mock.patch.object(ms.time, "time", return_value=1059.0):
+            self.assertEqual(cache.lookup("ns", self.payload), self.result)
+        with mock.patch.object(ms.time, "time", return_value=1061.0):
+            self.assertIsNone(cache.lookup("ns", self.payload))
+
+    def test_max_entries_trims_oldest(self) -> None:
+        cache = ms.SemanticCache(self.path, max_entries=2)
+        for i in range(3):
+            cache.store("ns", {"LAB": i}, {"concerns": [], "i": i})
+        self.assertIsNone(cache.lookup("ns", {"LAB": 0}))
+        self.assertEqual(cache.lookup("ns", {"LAB": 2})["i"], 2)
+
+    def test_storage_error_is_a_miss(self) -> None:
+        cache = ms.SemanticCache(self._tmp.name)  # a directory, not a database file
+        cache.store("ns", self.payload, self.result)
+        self.assertIsNone(cache.lookup("ns", self.payload))
+
+    def test_errors_are_not_cached(self) -> None:
+        calls = []
+
+        def compute(payload):
+            calls.append(payload)
+            return ms._clinical_error("Ollama request failed")
+
+        with mock.patch.object(ms, "_SEMANTIC_CACHE", self.cache):
+            ms._with_semantic_cache("ns", self.payload, compute)
+            ms._with_semantic_cache("ns", self.payload, compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_any_report_namespace_depends_on_worker_mode(self) -> None:
+        seen = []
+
+        def fake_cache(namespace, payload, compute):
+            seen.append(namespace)
+            return {}
+
+        with mock.patch.object(ms, "_with_semantic_cache", fake_cache):
+            for workers in (1, 4):
+                with mock.patch.object(ms, "OLLAMA_ANY_WORKERS", workers):
+                    ms.generate_any_report_reasoning([])
+        self.assertIn("any_report:combined", seen[0])
+        self.assertIn("any_report:fanout", seen[1])
+
+
+def _any_result(title: str, department: str, precautions: list[str]) -> dict:
+    return {
+        "concerns": [
+            {"title": title, "reason": "r", "doctorQuestions": []},
+            {"title": title + " extra", "reason": "r", "doctorQuestions": []},
+        ],
+        "recommendedDepartment": department,
+        "precautions": precautions,
+    }
+
+
+class MergeAnyReportResultsTest(unittest.TestCase):
+    def test_one_concern_per_value_in_input_order(self) -> None:
+        merged = ms._merge_any_report_results([
+            _any_result("High Glucose", "Endocrinology", ["Stay hydrated"]),
+            _any_result("Low Hemoglobin", "Endocrinology", ["stay hydrated", "Rest"]),
+        ])
+        self.assertEqual([c["title"] for c in merged["concerns"]], ["High Glucose", "Low Hemoglobin"])
+        self.assertEqual(merged["recommendedDepartment"], "Endocrinology")
+        # case-insensitive de-duplication keeps the first spelling
+        self.assertEqual(merged["precautions"], ["Stay hydrated", "Rest"])
+        self.assertNotIn("error", merged)
+
+    def test_different_departments_become_internal_medicine(self) -> None:
+        merged = ms._merge_any_report_results([
+            _any_result("A", "Cardiology", []),
+            _any_result("B", "Nephrology", []),
+        ])
+        self.assertEqual(merged["recommendedDepartment"], "Internal Medicine")
+
+    def test_precautions_capped_at_three(self) -> None:
+        merged = ms._merge_any_report_results([
+            _any_result("A", "", ["p1", "p2"]),
+            _any_result("B", "", ["p3", "p4"]),
+        ])
+        self.assertEqual(merged["precautions"], ["p1", "p2", "p3"])
+
+    def test_any_failed_value_fails_the_merge(self) -> None:
+        merged = ms._merge_any_report_results([
+            _any_result("A", "Cardiology", ["p1"]),
+            ms._any_report_error("Ollama request failed: connection refused"),
+        ])
+        self.assertTrue(merged["error"])
+        self.assertEqual(merged["concerns"], [])
+        self.assertIn("1 of 2", merged["message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
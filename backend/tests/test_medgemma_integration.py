@@ -18,6 +18,9 @@ import json
 import os
 import sys
 
+# Always hit the live model: cached results would hide an unreachable Ollama
+os.environ["OLLAMA_CACHE_DISABLE"] = "1"
+
 # Allow importing the service from backend/services
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from services.medgemma_service import generate_clinical_reasoning
@@ -1,15 +1,21 @@
 from flask import Flask, request, jsonify
 import joblib
 import numpy as np
-import pandas as pd
 import traceback
+import math
 import os
+from model import load_xgb_model, scaling_arrays, predict_proba
 
 app = Flask(__name__)
 
-# Load model and scaler
-model = joblib.load("models/igan_xgboost.pkl")
-scaler = joblib.load("models/scaler.pkl")
+# APP_DEBUG=1 adds formatted tracebacks to error responses
+DEBUG = os.environ.get("APP_DEBUG") == "1"
+
+# Load model and scaler once at import (shared by workers under gunicorn --preload)
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+model = load_xgb_model(MODEL_DIR)
+scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
+booster = model.get_booster()
 
 # Define expected input features
 expected_features = [
@@ -21,34 +27,107 @@ expected_features = [
     "ACR"
 ]
 
+# StandardScaler folded into one subtract-multiply on float32 rows
+# (statistics matched to expected_features by name; KeyError if the scaler differs)
+_MEAN, _INV_SCALE = scaling_arrays(scaler, expected_features)
+_FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+def error_response(e):
+    """500 response for a failed prediction; the traceback is only formatted in debug mode"""
+    resp = {"error": str(e)}
+    if DEBUG:
+        resp["trace"] = traceback.format_exc()
+    return jsonify(resp), 500
+
+def record_error(record):
+    """Why one input record cannot be predicted (-> 400), or None when it is valid"""
+    if not isinstance(record, dict):
+        return "Expected a JSON object of features"
+    missing = [feat for feat in expected_features if feat not in record]
+    if missing:
+        return f"Missing features: {missing}"
+    non_numeric, non_finite = [], []
+    for feat in expected_features:
+        value = record[feat]
+        if value is None:
+            continue  # treated as missing (NaN) by the model
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            number = float(value)
+        except (TypeError, ValueError):
+            non_numeric.append(feat)
+            continue
+        except OverflowError:  # e.g. a huge JSON integer
+            non_finite.append(feat)
+            continue
+        # "inf"/"nan" strings parse as floats, and values past float32 range become inf
+        if not math.isfinite(number) or abs(number) > _FLOAT32_MAX:
+            non_finite.append(feat)
+    if non_numeric:
+        return f"Non-numeric values for: {non_numeric}"
+    if non_finite:
+        return f"Non-finite values for: {non_finite}"
+    return None
+
+def predict_records(records):
+    """Scale and predict N records at once; returns (predictions, probabilities) arrays"""
+    # Build the (N, 6) matrix in training column order
+    rows = np.empty((len(records), len(expected_features)), dtype=np.float32)
+    for r, record in enumerate(records):
+        for i, feat in enumerate(expected_features):
+            value = record[feat]
+            rows[r, i] = np.nan if value is None else float(value)
+    input_scaled = (rows - _MEAN) * _INV_SCALE
+
+    probs = predict_proba(booster, input_scaled)
+    return probs.argmax(axis=1), probs
+
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
         data = request.get_json()
 
-        # Convert to DataFrame
-        input_df = pd.DataFrame([data])
+        # Check that all expected features are present and numeric
+        err = record_error(data)
+        if err:
+            return jsonify({"error": err}), 400
+
+        predictions, probs = predict_records([data])
 
-        # Check if all expected features are present
-        missing = [feat for feat in expected_features if feat not in input_df.columns]
-        if missing:
-            return jsonify({"error": f"Missing features: {missing}"}), 400
+        return jsonify({
+            "prediction": int(predictions[0]),
+            "probabilities": probs[0].tolist()
+        })
+
+    except (KeyError, ValueError, TypeError, RuntimeError) as e:
+        return error_response(e)
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    try:
+        data = request.get_json()
+        if not isinstance(data, list):
+            return jsonify({"error": "Expected a JSON list of records"}), 400
+        if not data:
+            return jsonify({"predictions": [], "probabilities": []})
 
-        # Reorder and scale
-        input_df = input_df[expected_features]
-        input_scaled = scaler.transform(input_df)
+        # Check every record before doing any work
+        for idx, record in enumerate(data):
+            err = record_error(record)
+            if err:
+                return jsonify({"error": f"Invalid record {idx}: {err}"}), 400
 
-        # Predict
-        prediction = model.predict(input_scaled)[0]
-        probability = model.predict_proba(input_scaled)[0].tolist()
+        predictions, probs = predict_records(data)
 
         return jsonify({
-            "prediction": int(prediction),
-            "probabilities": probability
+            "predictions": predictions.tolist(),
+            "probabilities": probs.tolist()
         })
 
-    except Exception as e:
-        return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
+    except (KeyError, ValueError, TypeError, RuntimeError) as e:
+        return error_response(e)
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    # Development server only; use wsgi.py with gunicorn for concurrent requests
+    app.run(debug=DEBUG, port=5000)
@@ -1,9 +1,20 @@
 import os
+import functools
+import importlib.util
+import json
+import warnings
 
 # Paths
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 RAW_DATA_PATH = os.path.join(DATA_DIR, "raw", "medical_lab_data_with_correlations.xlsx")
 PROCESSED_DATA_PATH = os.path.join(DATA_DIR, "processed", "processed_data.csv")
+# Scaled float32 feature matrix and int8 labels written by preprocess_data, plus column names
+FEATURES_NPY_PATH = os.path.join(DATA_DIR, "processed", "features.npy")
+FEATURES_JSON_PATH = os.path.join(DATA_DIR, "processed", "features.json")
+TARGET_NPY_PATH = os.path.join(DATA_DIR, "processed", "target.npy")
+
+# pandas CSV parser: multithreaded pyarrow when installed, else the default C engine
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
 
 # Model parameters
 MODEL_PARAMS = {
@@ -13,6 +24,36 @@ MODEL_PARAMS = {
     "random_state": 42
 }
 
+# Histogram tree construction; runs on GPU when xgb_device() resolves to "cuda"
+TRAIN_PARAMS = {"tree_method": "hist"}
+
+# XGBoost device: "auto" picks "cuda" only when a GPU is actually visible
+XGB_DEVICE = os.environ.get("XGB_DEVICE", "auto")
+
+@functools.lru_cache(maxsize=1)
+def xgb_device():
+    """Resolve XGB_DEVICE to the device string passed to XGBoost
+    
+    The stock Linux wheels are built with CUDA even on CPU-only hosts, so
+    "auto" runs one tiny boosting round on "cuda" and keeps it only if XGBoost
+    did not fall back to the CPU.
+    """
+    if XGB_DEVICE != "auto":
+        return XGB_DEVICE
+    import numpy as np
+    import xgboost as xgb
+    if not xgb.build_info().get("USE_CUDA"):
+        return "cpu"
+    try:
+        with warnings.catch_warnings(), xgb.config_context(verbosity=0):
+            warnings.simplefilter("ignore")
+            dtrain = xgb.DMatrix(np.array([[0.0], [1.0]]), label=[0, 1])
+            booster = xgb.train({"device": "cuda", "tree_method": "hist"}, dtrain, num_boost_round=1)
+        device = json.loads(booster.save_config())["learner"]["generic_param"]["device"]
+    except (xgb.core.XGBoostError, KeyError, ValueError):
+        return "cpu"
+    return "cuda" if device.startswith("cuda") else "cpu"
+
 # Feature columns (adjust based on your data)
 FEATURES = [
     "CREATININE (mg/dL)", "UREA (mg/dL)", "ALBUMIN (g/dL)", 
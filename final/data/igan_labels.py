@@ -20,35 +20,50 @@ def generate_igan_labels(df):
     
     # Ensure 15% prevalence
     positive_samples = int(0.15 * len(df))
-    current_positive = df['IgAN_Status'].sum()
+    status = df['IgAN_Status'].to_numpy()
+    current_positive = int(status.sum())
     
     if current_positive < positive_samples:
         additional_needed = positive_samples - current_positive
-        candidates = df[df['IgAN_Status'] == 0].nlargest(additional_needed, 'UREA (mg/dL)')
-        df.loc[candidates.index, 'IgAN_Status'] = 1
+        # Top-k urea among negatives without a full sort
+        neg_idx = np.flatnonzero(status == 0)
+        neg_urea = df['UREA (mg/dL)'].to_numpy()[neg_idx]
+        if additional_needed < len(neg_idx):
+            neg_idx = neg_idx[np.argpartition(-neg_urea, additional_needed - 1)[:additional_needed]]
+        df.iloc[neg_idx, df.columns.get_loc('IgAN_Status')] = 1
     return df
 
-def adjust_biomarker_correlations(df):
+def adjust_biomarker_correlations(df, rng=None):
     """Realistic biomarker distributions"""
-    mask = df['IgAN_Status'] == 1
+    rng = np.random.default_rng(42) if rng is None else rng
+    mask = (df['IgAN_Status'] == 1).to_numpy()
+    n_pos = int(mask.sum())
+    n_neg = len(df) - n_pos
     
-    # Kidney markers
-    df.loc[mask, 'CREATININE (mg/dL)'] = 1.3 + 0.4*np.random.beta(2, 5, sum(mask))  # Right-skewed
-    df.loc[mask, 'UREA (mg/dL)'] = 30 + 15*np.random.beta(2, 3, sum(mask))
+    # Kidney markers (biological noise added in the same assignment)
+    df.loc[mask, 'CREATININE (mg/dL)'] = 1.3 + 0.4*rng.beta(2, 5, n_pos) + rng.normal(0, 0.1, n_pos)  # Right-skewed
+    df.loc[mask, 'UREA (mg/dL)'] = 30 + 15*rng.beta(2, 3, n_pos) + rng.normal(0, 0.1, n_pos)
     
     # Proteinuria markers
-    df.loc[mask, 'ALBUMIN (g/dL)'] = 3.8 - 0.6*np.random.exponential(0.5, sum(mask))
+    df.loc[mask, 'ALBUMIN (g/dL)'] = 3.8 - 0.6*rng.exponential(0.5, n_pos) + rng.normal(0, 0.1, n_pos)
     
-    # Add biological noise
+    # Biological noise for the remaining rows
     for col in ['CREATININE (mg/dL)', 'UREA (mg/dL)', 'ALBUMIN (g/dL)']:
-        df[col] += np.random.normal(0, 0.1, len(df))
+        df.loc[~mask, col] += rng.normal(0, 0.1, n_neg)
     return df
 
+EGFR_CONST = 175 * (30**-0.203)  # Fixed age=30
+
 def add_derived_features(df):
     """Clinical feature engineering"""
-    df['eGFR'] = 175 * (df['CREATININE (mg/dL)']**-1.154) * (30**-0.203)  # Fixed age=30
-    df['UCR'] = df['UREA (mg/dL)'] / df['CREATININE (mg/dL)']  # Urea-Creatinine Ratio
-    df['ACR'] = df['ALBUMIN (g/dL)'] / df['CREATININE (mg/dL)']  # Albumin-Creatinine Ratio
+    creat = df['CREATININE (mg/dL)'].to_numpy(dtype=np.float64)
+    inv_creat = np.reciprocal(creat)  # shared by all three features
+    
+    egfr = np.power(inv_creat, 1.154)
+    egfr *= EGFR_CONST
+    df['eGFR'] = egfr
+    df['UCR'] = df['UREA (mg/dL)'].to_numpy(dtype=np.float64) * inv_creat  # Urea-Creatinine Ratio
+    df['ACR'] = df['ALBUMIN (g/dL)'].to_numpy(dtype=np.float64) * inv_creat  # Albumin-Creatinine Ratio
     return df
 
 def validate_output(df):
@@ -1,53 +1,109 @@
 #!/usr/bin/env python3
 import sys
 import json
+import functools
 import joblib
-import pandas as pd
 import numpy as np
+import xgboost as xgb
 from pathlib import Path
 
+MODEL_DIR = Path(__file__).parent / "models"
+
+# Expected features, in training column order
+EXPECTED_FEATURES = [
+    "CREATININE (mg/dL)",
+    "UREA (mg/dL)",
+    "ALBUMIN (g/dL)",
+    "URIC ACID (mg/dL)",
+    "eGFR",
+    "ACR"
+]
+
+def load_xgb_model(model_dir=MODEL_DIR):
+    """
+    Load the classifier from native igan_xgboost.json, falling back to the legacy pickle
+    """
+    json_path = Path(model_dir) / "igan_xgboost.json"
+    if json_path.exists():
+        model = xgb.XGBClassifier()
+        model.load_model(str(json_path))
+        return model
+    return joblib.load(Path(model_dir) / "igan_xgboost.pkl")
+
+@functools.lru_cache(maxsize=1)
+def _get_model():
+    """
+    Load the trained model and scaler once per process
+    """
+    model = load_xgb_model()
+    scaler = joblib.load(MODEL_DIR / "scaler.pkl")
+    return model, scaler
+
+def scaling_arrays(scaler, columns=None):
+    """
+    Fitted StandardScaler as float32 (mean, 1/scale) so scaling is one subtract-multiply.
+    With columns, the statistics are reordered (or subset) by the scaler's
+    feature_names_in_ to match them; unknown columns raise KeyError.
+    """
+    mean, scale = scaler.mean_, scaler.scale_
+    if columns is not None:
+        names = list(getattr(scaler, "feature_names_in_", []))
+        missing = [c for c in columns if c not in names]
+        if missing:
+            raise KeyError(f"Scaler was not fitted on: {missing}")
+        idx = [names.index(c) for c in columns]
+        mean, scale = mean[idx], scale[idx]
+    mean = mean.astype(np.float32)
+    inv_scale = (1.0 / scale).astype(np.float32)
+    return mean, inv_scale
+
+def predict_proba(booster, input_scaled):
+    """
+    Class probabilities from a single booster pass (binary models return P(IgAN) only)
+    """
+    probs = booster.inplace_predict(input_scaled.astype(np.float32, copy=False))
+    if probs.ndim == 1:
+        probs = np.column_stack((1.0 - probs, probs))
+    return probs
+
+@functools.lru_cache(maxsize=1)
+def _get_scaling():
+    """
+    Scaler mean and inverse scale in EXPECTED_FEATURES order, computed once per process
+    """
+    _, scaler = _get_model()
+    return scaling_arrays(scaler, EXPECTED_FEATURES)
+
 def predict_igan(input_data):
     """
     Make a prediction using the trained XGBoost model
     """
     try:
-        # Load model and scaler
-        model_path = Path(__file__).parent / "models" / "igan_xgboost.pkl"
-        scaler_path = Path(__file__).parent / "models" / "scaler.pkl"
-        
-        model = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
-        
-        # Expected features
-        expected_features = [
-            "CREATININE (mg/dL)",
-            "UREA (mg/dL)",
-            "ALBUMIN (g/dL)",
-            "URIC ACID (mg/dL)",
-            "eGFR",
-            "ACR"
-        ]
-        
-        # Create DataFrame from input
-        input_df = pd.DataFrame([input_data])
+        # Load model and scaler (cached after the first call)
+        model, _ = _get_model()
+        mean, inv_scale = _get_scaling()
         
         # Check for missing features
-        missing = [feat for feat in expected_features if feat not in input_df.columns]
+        missing = [feat for feat in EXPECTED_FEATURES if feat not in input_data]
         if missing:
             return {
                 "error": f"Missing features: {missing}",
                 "status": "error"
             }
         
-        # Reorder columns to match training data
-        input_df = input_df[expected_features]
+        # Build the single row in training column order
+        row = np.empty((1, len(EXPECTED_FEATURES)), dtype=np.float32)
+        for i, feat in enumerate(EXPECTED_FEATURES):
+            value = input_data[feat]
+            row[0, i] = np.nan if value is None else value
         
         # Scale the input data
-        input_scaled = scaler.transform(input_df)
+        input_scaled = (row - mean) * inv_scale
         
         # Make prediction
-        prediction = int(model.predict(input_scaled)[0])
-        probabilities = model.predict_proba(input_scaled)[0].tolist()
+        probs = predict_proba(model.get_booster(), input_scaled)
+        prediction = int(probs[0].argmax())
+        probabilities = probs[0].tolist()
         
         return {
             "prediction": prediction,
@@ -1,70 +1,198 @@
-import pandas as pd
 import numpy as np
 from sklearn.metrics import (
     classification_report,
-    confusion_matrix,
     roc_auc_score,
-    precision_recall_curve,
-    average_precision_score,
-    precision_score,
-    recall_score,
-    f1_score,
-    accuracy_score,
-    r2_score,
-    mean_squared_error
+    average_precision_score
 )
-from sklearn.model_selection import cross_validate
-import matplotlib.pyplot as plt
-import seaborn as sns
-import shap
+from sklearn.model_selection import cross_validate, StratifiedKFold
+from threadpoolctl import threadpool_limits
+import xgboost as xgb
 import joblib
 import argparse
+import functools
+import json
+import os
+import sys
 from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (xgb_device, FEATURES, FEATURES_NPY_PATH, FEATURES_JSON_PATH,
+                    TARGET_NPY_PATH)
+from preprocess import apply_scale, load_features
+from model import load_xgb_model, scaling_arrays
 
-def load_data(feature_args):
-    """Map simplified names to actual column names"""
-    df = pd.read_csv(Path('data')/'processed'/'processed_data.csv')
-    
-    # Create mapping between simple names and actual columns
-    feature_map = {
-        'CREATININE': 'CREATININE (mg/dL)',
-        'UREA': 'UREA (mg/dL)',
-        'ALBUMIN': 'ALBUMIN (g/dL)',
-        'URIC_ACID': 'URIC ACID (mg/dL)',  # Added
-        'eGFR': 'eGFR',
-        'ACR': 'ACR'  # Added
-    }
-    
-    # Convert input features to actual column names
-    features = [feature_map.get(f, f) for f in feature_args]
+DATA_PATH = Path('data')/'processed'/'processed_data.csv'
+SCALER_PATH = Path('models')/'scaler.pkl'
+
+# On-disk memo for CSV reads; entries are keyed on the arguments plus input file mtimes
+memory = joblib.Memory(location='.cache', verbose=0)
+
+# Create mapping between simple names and actual columns
+FEATURE_MAP = {
+    'CREATININE': 'CREATININE (mg/dL)',
+    'UREA': 'UREA (mg/dL)',
+    'ALBUMIN': 'ALBUMIN (g/dL)',
+    'URIC_ACID': 'URIC ACID (mg/dL)',  # Added
+    'eGFR': 'eGFR',
+    'ACR': 'ACR'  # Added
+}
+
+def resolve_features(feature_args):
+    """Convert input features to actual column names"""
+    return [FEATURE_MAP.get(f, f) for f in feature_args]
+
+def training_order(feature_args):
+    """Sort requested features into FEATURES order, the column order the model was trained on"""
+    features = resolve_features(feature_args)
     
     # Verify all features exist
-    missing = [f for f in features if f not in df.columns]
+    missing = [f for f in features if f not in FEATURES]
     if missing:
         raise KeyError(f"Features not found: {missing}\n"
-                     f"Available columns: {list(df.columns)}")
+                     f"Available features: {FEATURES}")
+    
+    return sorted(feature_args, key=lambda f: FEATURES.index(FEATURE_MAP.get(f, f)))
+
+def load_data(feature_args):
+    """Map simplified names to actual column names
+    
+    Features come from preprocess.load_features, so eGFR and ACR are recomputed
+    exactly as for training (and as stored in features.npy) rather than taken
+    from the CSV's own columns. Columns are returned in training order whatever
+    order they were requested in.
+    """
+    features = resolve_features(training_order(feature_args))
+    X, y = load_features(DATA_PATH)
+    return X[features], y
+
+def load_processed_data(feature_args):
+    """Scaled X and labels from preprocess_data's .npy files, memory-mapped (no CSV read)
+    
+    Returns None when an artifact is missing, older than the CSV, was scaled
+    with different statistics than scaler.pkl, or lacks a requested column, so
+    the caller falls back to the CSV and scaler.pkl (which yields the same matrix).
+    Columns come back in meta['columns'] order, as load_data returns them.
+    """
+    paths = (FEATURES_NPY_PATH, FEATURES_JSON_PATH, TARGET_NPY_PATH)
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    if min(os.path.getmtime(p) for p in paths) < os.path.getmtime(DATA_PATH):
+        return None  # CSV regenerated since preprocessing
+    with open(FEATURES_JSON_PATH) as f:
+        meta = json.load(f)
+    # train.py dumps scaler.pkl after preprocessing, so compare contents, not mtimes
+    scaler = joblib.load(SCALER_PATH)
+    if not (isinstance(meta, dict)
+            and np.array_equal(meta.get('mean'), scaler.mean_)
+            and np.array_equal(meta.get('scale'), scaler.scale_)):
+        return None
+    columns = meta['columns']
+    features = resolve_features(feature_args)
+    if any(f not in columns for f in features):
+        return None
+    # Slice in the stored (training) column order, not the order requested
+    features.sort(key=columns.index)
+    X = np.load(FEATURES_NPY_PATH, mmap_mode='r')
+    y = np.load(TARGET_NPY_PATH, mmap_mode='r')
+    idx = [columns.index(f) for f in features]
+    return (X if idx == list(range(X.shape[1])) else X[:, idx]), y
+
+@memory.cache
+def _load_scaled_data(feature_args, data_mtime, scaler_mtime):
+    X, y = load_data(list(feature_args))
+    
+    # Standard scaling (in place on a float32 copy; statistics matched to the
+    # requested columns by name, like scaler.transform's feature-name check)
+    scaler = joblib.load(SCALER_PATH)
+    X_scaled = X.to_numpy(dtype=np.float32, copy=True)
+    apply_scale(X_scaled, *scaling_arrays(scaler, list(X.columns)), out=X_scaled)
+    return X_scaled, y
+
+def load_scaled_data(feature_args):
+    """load_data plus scaler.pkl scaling, memoized until the CSV or scaler changes"""
+    return _load_scaled_data(tuple(feature_args), os.path.getmtime(DATA_PATH),
+                             os.path.getmtime(SCALER_PATH))
+
+@functools.lru_cache(maxsize=4)
+def get_tree_explainer(model):
+    """One explainer per model object, reused across calls"""
+    return make_tree_explainer(model)
+
+def compute_shap_values(model, X):
+    """SHAP values (n_samples, n_features)
     
-    return df[features], df['IgAN_Status']
+    XGBoost models use the booster's native TreeSHAP (pred_contribs, GPUTreeSHAP
+    on a cuda device) with the trailing bias column dropped; linear models use
+    the closed form coef * (x - mean) in log-odds, with no explainer at all;
+    other tree models go through the cached explainer.
+    """
+    if hasattr(model, 'get_booster'):
+        contribs = model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+        return contribs[:, :-1]
+    if not hasattr(model, 'feature_importances_') and hasattr(model, 'coef_'):
+        X = np.asarray(X, dtype=np.float32)
+        return (X - X.mean(axis=0)) * model.coef_[0].astype(np.float32)
+    return get_tree_explainer(model).shap_values(X)
+
+# Materialized CV folds keyed by the label vector, reused across evaluate_model calls
+_SPLITS_CACHE = {}
+
+def get_cv_splits(y, n_splits=5):
+    """Shuffled, seeded stratified folds for y (same folds every run)"""
+    yt = np.asarray(y)
+    key = (n_splits, len(yt), int(yt.sum()), hash(yt.tobytes()))
+    if key not in _SPLITS_CACHE:
+        kf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+        _SPLITS_CACHE[key] = list(kf.split(np.zeros(len(yt)), yt))
+    return _SPLITS_CACHE[key]
+
+def binary_metrics(y, y_pred):
+    """Confusion matrix, precision, recall and specificity from one set of tp/fp/fn/tn counts"""
+    yt = np.asarray(y).astype(bool)
+    yp = np.asarray(y_pred).astype(bool)
+    tp = int(np.count_nonzero(yp & yt))
+    fp = int(np.count_nonzero(yp)) - tp
+    fn = int(np.count_nonzero(yt)) - tp
+    tn = len(yt) - tp - fp - fn
+    return {
+        'confusion_matrix': np.array([[tn, fp], [fn, tp]]),
+        'precision': tp / (tp + fp) if tp + fp else 0.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0,
+        'specificity': tn / (tn + fp) if tn + fp else 0.0
+    }
 
-def evaluate_model(model, X, y, feature_names):
-    """Enhanced evaluation with clinical insights"""
+def evaluate_model(model, X, y, feature_names, explain=False, n_jobs=-1, predict_threads=None):
+    """Enhanced evaluation with clinical insights (explain=True also computes SHAP values once)
     
-    # Cross-validation
-    cv_results = cross_validate(model, X, y, cv=5,
-                              scoring=['accuracy', 'precision', 'recall', 'f1', 'roc_auc'])
+    n_jobs: folds fitted in parallel (loky workers); pass 1 when already running
+    inside an outer joblib.parallel_backend to avoid nested parallelism.
+    predict_threads: cap on OpenMP threads for the final predict and SHAP calls
+    (e.g. 1 when several evaluations run side by side); None keeps the default.
+    loky already limits threads inside the CV workers themselves.
+    """
     
-    # Final evaluation
-    y_pred = model.predict(X)
-    y_proba = model.predict_proba(X)[:, 1]
+    # Cross-validation (one fold per worker)
+    cv_results = cross_validate(model, X, y, cv=get_cv_splits(y),
+                              scoring=['accuracy', 'precision', 'recall', 'f1', 'roc_auc'],
+                              n_jobs=n_jobs, pre_dispatch='2*n_jobs')
+    
+    # Final evaluation: one probability pass, labels are a threshold away
+    # (> 0.5 matches XGBClassifier.predict / LogisticRegression.predict)
+    with threadpool_limits(limits=predict_threads, user_api='openmp'):
+        y_proba = model.predict_proba(X)[:, 1]
+        # SHAP values for every row in one batch, reused by the clinical report
+        shap_values = compute_shap_values(model, X) if explain else None
+    y_pred = (y_proba > 0.5).astype(np.int8)
     
     # Metrics
     report = classification_report(y, y_pred, target_names=['Healthy', 'IgAN'])
-    cm = confusion_matrix(y, y_pred)
+    counts = binary_metrics(y, y_pred)
     roc_auc = roc_auc_score(y, y_proba)
     pr_auc = average_precision_score(y, y_proba)
     
-    # Feature importance
-    if hasattr(model, 'feature_importances_'):
+    # Feature importance (mean |SHAP| when explaining, so it matches the summary plot)
+    if shap_values is not None:
+        importance = np.abs(shap_values).mean(axis=0)
+    elif hasattr(model, 'feature_importances_'):
         importance = model.feature_importances_
     else:
         importance = np.abs(model.coef_[0])
@@ -72,51 +200,78 @@ def evaluate_model(model, X, y, feature_names):
     return {
         'cv_mean_accuracy': np.mean(cv_results['test_accuracy']),
         'cv_std_accuracy': np.std(cv_results['test_accuracy']),
-        'precision': precision_score(y, y_pred),
-        'recall': recall_score(y, y_pred),
+        'precision': counts['precision'],
+        'recall': counts['recall'],
+        'specificity': counts['specificity'],
         'roc_auc': roc_auc,
         'pr_auc': pr_auc,
         'report': report,
-        'confusion_matrix': cm,
-        'feature_importance': dict(zip(feature_names, importance))
+        'confusion_matrix': counts['confusion_matrix'],
+        'feature_importance': (np.asarray(feature_names), np.asarray(importance)),
+        'y_pred': y_pred,
+        'y_proba': y_proba,
+        'shap_values': shap_values
     }
 
-def generate_clinical_report(results, feature_names):
+def make_tree_explainer(model):
+    """FastTreeSHAP (v2, all cores) when installed, else shap.TreeExplainer"""
+    try:
+        import fasttreeshap  # parallel drop-in TreeExplainer
+    except ImportError:
+        import shap
+        return shap.TreeExplainer(model)
+    return fasttreeshap.TreeExplainer(model, algorithm="v2", n_jobs=-1, shortcut=False)
+
+def generate_clinical_report(results, feature_names, model, X):
     """Create clinician-friendly outputs"""
+    # Plotting libraries are only needed here, so the metrics-only CLI path skips them
+    import matplotlib.pyplot as plt
+    import shap
     
     # 1. Performance Summary
     print("\n=== CLINICAL PERFORMANCE REPORT ===")
     print(f"Cross-Validated Accuracy: {results['cv_mean_accuracy']:.1%} (±{results['cv_std_accuracy']:.1%})")
     print(f"Sensitivity (Recall): {results['recall']:.1%}")
-    print(f"Specificity: {results['confusion_matrix'][0,0]/sum(results['confusion_matrix'][0]):.1%}")
+    print(f"Specificity: {results['specificity']:.1%}")
     print(f"ROC AUC: {results['roc_auc']:.3f}")
     print(f"PR AUC: {results['pr_auc']:.3f}\n")
     
-    # 2. Confusion Matrix Visualization
-    plt.figure(figsize=(6,6))
-    sns.heatmap(results['confusion_matrix'], annot=True, fmt='d', cmap='Blues',
-               xticklabels=['Predicted Healthy', 'Predicted IgAN'],
-               yticklabels=['Actual Healthy', 'Actual IgAN'])
-    plt.title('Confusion Matrix')
+    # 2. Confusion Matrix Visualization (annotated imshow)
+    cm = results['confusion_matrix']
+    fig, ax = plt.subplots(figsize=(6,6))
+    im = ax.imshow(cm, cmap='Blues')
+    fig.colorbar(im, ax=ax)
+    ax.set_xticks([0, 1], ['Predicted Healthy', 'Predicted IgAN'])
+    ax.set_yticks([0, 1], ['Actual Healthy', 'Actual IgAN'])
+    for (i, j), v in np.ndenumerate(cm):
+        ax.text(j, i, str(v), ha='center', va='center',
+                color='white' if v > cm.max() / 2 else 'black')
+    ax.set_title('Confusion Matrix')
     plt.tight_layout()
     plt.savefig('clinical_confusion_matrix.png')
     
-    # 3. Feature Importance
-    importance_df = pd.DataFrame({
-        'Feature': feature_names,
-        'Importance': results['feature_importance'].values()
-    }).sort_values('Importance', ascending=False)
+    # SHAP values computed once (in evaluate_model when explain=True) and shared
+    # by the importance chart and the summary plot
+    shap_values = results.get('shap_values')
+    if shap_values is None:
+        shap_values = compute_shap_values(model, X)
+        names, values = np.asarray(feature_names), np.abs(shap_values).mean(axis=0)
+    else:
+        names, values = results['feature_importance']  # already mean |SHAP|
+    
+    # 3. Feature Importance (mean |SHAP| per feature, descending)
+    idx = np.argsort(-values)
     
-    plt.figure(figsize=(10,6))
-    sns.barplot(x='Importance', y='Feature', data=importance_df, palette='viridis')
-    plt.title('Clinical Feature Importance')
+    fig, ax = plt.subplots(figsize=(10,6))
+    ax.barh(names[idx], values[idx], color=plt.cm.viridis(np.linspace(0, 1, len(idx))))
+    ax.invert_yaxis()  # most important on top
+    ax.set_xlabel('Importance')
+    ax.set_ylabel('Feature')
+    ax.set_title('Clinical Feature Importance')
     plt.tight_layout()
     plt.savefig('clinical_feature_importance.png')
     
     # 4. SHAP Explanations (for single patient)
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(X)
-    
     plt.figure()
     shap.summary_plot(shap_values, X, feature_names=feature_names, show=False)
     plt.tight_layout()
@@ -126,7 +281,7 @@ def generate_clinical_report(results, feature_names):
         'performance_metrics': {
             'accuracy': results['cv_mean_accuracy'],
             'sensitivity': results['recall'],
-            'specificity': results['confusion_matrix'][0,0]/sum(results['confusion_matrix'][0]),
+            'specificity': results['specificity'],
             'roc_auc': results['roc_auc']
         },
         'saved_plots': [
@@ -142,24 +297,37 @@ if __name__ == "__main__":
                       help='List of features to evaluate')
     parser.add_argument('--clinical_report', action='store_true',
                       help='Generate clinician-friendly outputs')
+    parser.add_argument('--n_jobs', type=int, default=-1,
+                      help='Parallel cross-validation workers (-1 = all cores)')
+    parser.add_argument('--predict_threads', type=int, default=None,
+                      help='Cap OpenMP threads for prediction and SHAP (default: no cap)')
     args = parser.parse_args()
     
     # Load model and data
-    model = joblib.load(Path('models')/'igan_xgboost.pkl')
-    X, y = load_data(args.features)
+    model = load_xgb_model(Path('models'))
+    if hasattr(model, 'get_booster'):
+        model.set_params(device=xgb_device())  # GPU inference/CV when available
+    
+    # Model columns are positional, so keep inputs (and report labels) in training order
+    args.features = training_order(args.features)
     
-    # Standard scaling
-    scaler = joblib.load(Path('models')/'scaler.pkl')
-    X_scaled = scaler.transform(X)
+    # Pre-scaled float32 matrix and labels from preprocess_data when available
+    data = load_processed_data(args.features)
+    if data is not None:
+        X_scaled, y = data
+    else:
+        X_scaled, y = load_scaled_data(args.features)
     
     # Evaluations
-    results = evaluate_model(model, X_scaled, y, args.features)
+    results = evaluate_model(model, X_scaled, y, args.features,
+                             explain=args.clinical_report, n_jobs=args.n_jobs,
+                             predict_threads=args.predict_threads)
     
     print("=== Detailed Classification Report ===")
     print(results['report'])
     
     if args.clinical_report:
-        clinical_output = generate_clinical_report(results, args.features)
+        clinical_output = generate_clinical_report(results, args.features, model, X_scaled)
         print("\nClinical report generated with:")
         print(f"- Performance metrics")
         print(f"- Visualizations saved to: {clinical_output['saved_plots']}")
\ No newline at end of file
@@ -2,26 +2,64 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
+import json
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import PROCESSED_DATA_PATH, FEATURES, TARGET
+from config import (PROCESSED_DATA_PATH, FEATURES, TARGET, CSV_ENGINE,
+                    FEATURES_NPY_PATH, FEATURES_JSON_PATH, TARGET_NPY_PATH)
+from model import scaling_arrays
 
-def preprocess_data():
-    # Load data
-    df = pd.read_csv(PROCESSED_DATA_PATH)
+def apply_scale(X, mean, inv_scale, out=None):
+    """(X - mean) * inv_scale broadcast over rows; pass out=X to scale in place"""
+    out = np.subtract(X, mean, out=out)
+    np.multiply(out, inv_scale, out=out)
+    return out
+
+def save_features(X_scaled, y, columns, scaler):
+    """Persist the scaled matrix and int8 labels as .npy
+    
+    The JSON sidecar holds the column names and the scaler statistics used, so
+    readers can tell when the matrix no longer matches scaler.pkl.
+    """
+    np.save(FEATURES_NPY_PATH, X_scaled)
+    np.save(TARGET_NPY_PATH, y.to_numpy(dtype=np.int8))
+    with open(FEATURES_JSON_PATH, 'w') as f:
+        json.dump({'columns': list(columns),
+                   'mean': scaler.mean_.tolist(),
+                   'scale': scaler.scale_.tolist()}, f)
+
+def load_features(path=PROCESSED_DATA_PATH):
+    """Unscaled model features (FEATURES order) and target, with eGFR and ACR recomputed"""
+    # Load data (only the raw columns used below; eGFR and ACR are recomputed)
+    usecols = [f for f in FEATURES if f not in ('eGFR', 'ACR')] + [TARGET]
+    df = pd.read_csv(path, engine=CSV_ENGINE, usecols=usecols)
 
-    # Feature engineering: Add eGFR and ACR
-    df['eGFR'] = 141 * np.minimum(df['CREATININE (mg/dL)']/0.9, 1)**-0.411
-    df['ACR'] = df['ALBUMIN (g/dL)'] / df['CREATININE (mg/dL)']
+    # Feature engineering: Add eGFR and ACR (float32 arrays, fused in-place ops)
+    cre = df['CREATININE (mg/dL)'].to_numpy(dtype=np.float32)
+    alb = df['ALBUMIN (g/dL)'].to_numpy(dtype=np.float32)
+    egfr = np.empty_like(cre)  # single buffer, every step below writes into it
+    np.divide(cre, np.float32(0.9), out=egfr)
+    np.minimum(egfr, np.float32(1.0), out=egfr)
+    np.power(egfr, np.float32(-0.411), out=egfr)
+    egfr *= np.float32(141.0)
+    df['eGFR'] = egfr
+    df['ACR'] = alb / cre
 
     # Select features and target
-    X = df[FEATURES]
-    y = df[TARGET]
+    return df[FEATURES], df[TARGET]
+
+def preprocess_data():
+    X, y = load_features()
+
+    # Scale features (fit only computes mean/std; the transform is done in place)
+    scaler = StandardScaler().fit(X)
+    X_scaled = X.to_numpy(dtype=np.float32, copy=True)
+    apply_scale(X_scaled, *scaling_arrays(scaler), out=X_scaled)
 
-    # Scale features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # Column-major so evaluate.py can memory-map and slice single features cheaply
+    X_scaled = np.asfortranarray(X_scaled)
+    save_features(X_scaled, y, FEATURES, scaler)
 
     # Train-test split
     X_train, X_test, y_train, y_test = train_test_split(
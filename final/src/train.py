@@ -3,19 +3,22 @@ import joblib
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import MODEL_PARAMS
+from config import MODEL_PARAMS, TRAIN_PARAMS, xgb_device
 from preprocess import preprocess_data
 
 def train_model():
     # Get preprocessed data
     X_train, _, y_train, _, scaler = preprocess_data()
 
-    # Train model
-    model = xgb.XGBClassifier(**MODEL_PARAMS)
+    # Train model (GPU histogram method when CUDA is available)
+    model = xgb.XGBClassifier(**MODEL_PARAMS, **TRAIN_PARAMS, device=xgb_device())
     model.fit(X_train, y_train)
+    
+    # Serve on CPU: single-row predictions in app.py/model.py take host arrays
+    model.set_params(device="cpu")
 
-    # Save model and scaler
-    joblib.dump(model, "models/igan_xgboost.pkl")
+    # Save model (native XGBoost JSON) and scaler
+    model.save_model("models/igan_xgboost.json")
     joblib.dump(scaler, "models/scaler.pkl")
     print("Model trained and saved.")
 
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the Flask API's input validation and batch endpoint.
+
+Loads the model and scaler from final/models like the app does at import.
+
+Run from final/:
+  python -m unittest tests.test_app
+"""
+
+import os
+import sys
+import unittest
+
+# Same import layout as the app: final/ on the path
+FINAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, FINAL_DIR)
+import app as api
+
+VALID = {
+    "CREATININE (mg/dL)": 1.4,
+    "UREA (mg/dL)": 45.0,
+    "ALBUMIN (g/dL)": 3.6,
+    "URIC ACID (mg/dL)": 6.8,
+    "eGFR": 55.0,
+    "ACR": 320.0,
+}
+
+
+class RecordErrorTest(unittest.TestCase):
+    def test_valid_record(self):
+        self.assertIsNone(api.record_error(VALID))
+        self.assertIsNone(api.record_error(dict(VALID, ACR="320")))
+
+    def test_none_is_allowed_as_missing(self):
+        self.assertIsNone(api.record_error(dict(VALID, eGFR=None)))
+
+    def test_not_an_object(self):
+        self.assertEqual(api.record_error([1, 2]), "Expected a JSON object of features")
+
+    def test_missing_feature(self):
+        record = dict(VALID)
+        del record["ACR"]
+        self.assertEqual(api.record_error(record), "Missing features: ['ACR']")
+
+    def test_non_numeric(self):
+        for value in ("high", True, [1.0], {"v": 1}):
+            self.assertEqual(api.record_error(dict(VALID, eGFR=value)),
+                             "Non-numeric values for: ['eGFR']", value)
+
+    def test_non_finite(self):
+        for value in (10**400, "inf", "-Infinity", "nan", 1e300):
+            self.assertEqual(api.record_error(dict(VALID, ACR=value)),
+                             "Non-finite values for: ['ACR']", value)
+
+
+class PredictBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.client = api.app.test_client()
+
+    def test_batch_matches_single_predictions(self):
+        records = [VALID, dict(VALID, eGFR=110.0, ACR=10.0), dict(VALID, UREA=None)]
+        resp = self.client.post("/predict_batch", json=records)
+        self.assertEqual(resp.status_code, 200)
+        body = resp.get_json()
+        self.assertEqual(len(body["predictions"]), 3)
+        for record, prediction, probs in zip(records, body["predictions"], body["probabilities"]):
+            single = self.client.post("/predict", json=record).get_json()
+            self.assertEqual(single["prediction"], prediction)
+            self.assertEqual(single["probabilities"], probs)
+
+    def test_empty_batch(self):
+        resp = self.client.post("/predict_batch", json=[])
+        self.assertEqual(resp.get_json(), {"predictions": [], "probabilities": []})
+
+    def test_not_a_list(self):
+        resp = self.client.post("/predict_batch", json=VALID)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.get_json()["error"], "Expected a JSON list of records")
+
+    def test_invalid_record_is_a_400(self):
+        resp = self.client.post("/predict_batch", json=[VALID, "oops"])
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.get_json()["error"],
+                         "Invalid record 1: Expected a JSON object of features")
+
+    def test_huge_integer_is_a_400(self):
+        record = dict(VALID, ACR=10**400)
+        for path, payload in (("/predict", record), ("/predict_batch", [record])):
+            resp = self.client.post(path, json=payload)
+            self.assertEqual(resp.status_code, 400, path)
+            self.assertIn("Non-finite values for: ['ACR']", resp.get_json()["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pure evaluation helpers (no trained model or data files needed).
+
+Run from final/:
+  python -m unittest tests.test_evaluate_helpers
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import confusion_matrix, precision_score, recall_score
+from sklearn.preprocessing import StandardScaler
+
+# Same import layout as the scripts: final/ and final/src on the path
+FINAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, FINAL_DIR)
+sys.path.insert(0, os.path.join(FINAL_DIR, "src"))
+from evaluate import binary_metrics, training_order
+from model import scaling_arrays
+
+
+class BinaryMetricsTest(unittest.TestCase):
+    def test_matches_sklearn(self):
+        rng = np.random.default_rng(0)
+        y = rng.integers(0, 2, 200)
+        y_pred = rng.integers(0, 2, 200).astype(np.int8)
+        m = binary_metrics(pd.Series(y), y_pred)
+        cm = confusion_matrix(y, y_pred)
+        np.testing.assert_array_equal(m['confusion_matrix'], cm)
+        self.assertAlmostEqual(m['precision'], precision_score(y, y_pred))
+        self.assertAlmostEqual(m['recall'], recall_score(y, y_pred))
+        tn, fp = cm[0]
+        self.assertAlmostEqual(m['specificity'], tn / (tn + fp))
+
+    def test_no_positive_predictions_gives_zero_not_nan(self):
+        m = binary_metrics([0, 1, 1], [0, 0, 0])
+        self.assertEqual(m['precision'], 0.0)
+        self.assertEqual(m['recall'], 0.0)
+        self.assertEqual(m['specificity'], 1.0)
+        np.testing.assert_array_equal(m['confusion_matrix'], [[1, 0], [2, 0]])
+
+
+
+class ScalingArraysTest(unittest.TestCase):
+    def setUp(self):
+        X = pd.DataFrame({'a': [1.0, 2.0, 3.0], 'b': [10.0, 30.0, 50.0]})
+        self.scaler = StandardScaler().fit(X)
+        self.X = X
+
+    def test_matches_transform(self):
+        mean, inv_scale = scaling_arrays(self.scaler)
+        np.testing.assert_allclose((self.X.to_numpy() - mean) * inv_scale,
+                                   self.scaler.transform(self.X), rtol=1e-6)
+
+    def test_reorders_by_column_name(self):
+        mean, inv_scale = scaling_arrays(self.scaler, ['b', 'a'])
+        np.testing.assert_allclose((self.X[['b', 'a']].to_numpy() - mean) * inv_scale,
+                                   self.scaler.transform(self.X)[:, ::-1], rtol=1e-6)
+
+    def test_unknown_column_raises(self):
+        with self.assertRaises(KeyError):
+            scaling_arrays(self.scaler, ['a', 'c'])
+
+
+class TrainingOrderTest(unittest.TestCase):
+    def test_sorted_into_features_order(self):
+        self.assertEqual(training_order(['eGFR', 'UREA', 'CREATININE']),
+                         ['CREATININE', 'UREA', 'eGFR'])
+
+    def test_unknown_feature_raises(self):
+        with self.assertRaises(KeyError):
+            training_order(['CREATININE', 'HEMOGLOBIN'])
+
+
+if __name__ == '__main__':
+    unittest.main()
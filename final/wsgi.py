@@ -0,0 +1,11 @@
+"""
+WSGI entrypoint for serving the prediction API in production.
+
+    gunicorn -w $((2 * $(nproc) + 1)) --preload --worker-class gthread --threads 4 --timeout 30 --bind 0.0.0.0:5000 wsgi:application
+
+--preload imports app (and loads the model and scaler) once in the master;
+workers share those pages copy-on-write instead of loading their own copy.
+"""
+from app import app
+
+application = app